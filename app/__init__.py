@@ -4,12 +4,19 @@ Inicialização da aplicação Flask E-commerce API
 Este módulo configura e inicializa a aplicação Flask com todas as suas extensões,
 blueprints e configurações necessárias.
 """
-from flask import Flask
+from flask import Flask, g, session, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_cors import CORS
+from flask_caching import Cache
+from flask_session import Session
+from sqlalchemy import event
+from sqlalchemy.orm import configure_mappers, make_transient_to_detached
+from rq import Queue
+import redis
 import os
 import sys
+import time
 
 # Adicionar o diretório pai ao path para importar config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -17,6 +24,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Inicializar extensões
 db = SQLAlchemy()
 login_manager = LoginManager()
+cache = Cache()
+server_session = Session()
 
 def create_app(config_name=None):
     """
@@ -30,6 +39,10 @@ def create_app(config_name=None):
     """
     app = Flask(__name__)
     
+    # Serialização JSON com orjson
+    from app.json_provider import OrjsonProvider
+    app.json = OrjsonProvider(app)
+    
     # Carregar configurações
     if config_name is None:
         config_name = 'development'
@@ -40,11 +53,29 @@ def create_app(config_name=None):
     # Inicializar extensões com a aplicação
     db.init_app(app)
     login_manager.init_app(app)
+    cache.init_app(app)
     CORS(app)
     
+    # Sessões no servidor (apenas quando SESSION_TYPE estiver configurado)
+    if app.config.get('SESSION_TYPE'):
+        if app.config['SESSION_TYPE'] == 'redis':
+            app.config.setdefault('SESSION_REDIS', redis.Redis.from_url(app.config['REDIS_URL']))
+        server_session.init_app(app)
+    
+    # Fila de tarefas assíncronas (apenas quando habilitada)
+    if app.config.get('TASK_QUEUE_ENABLED'):
+        app.extensions['task_queue'] = Queue(
+            app.config['TASK_QUEUE_NAME'],
+            connection=redis.Redis.from_url(app.config['REDIS_URL'])
+        )
+    
     # Criar modelos após inicializar o db
     from app.models import get_all_models
     
+    # Configurar todos os mapeamentos (relacionamentos, back_populates) na
+    # inicialização, em vez de na primeira consulta da primeira requisição
+    configure_mappers()
+    
     # Configurar Flask-Login
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Por favor, faça login para acessar esta página.'
@@ -52,8 +83,26 @@ def create_app(config_name=None):
     
     @login_manager.user_loader
     def load_user(user_id):
+        user_id = int(user_id)
+        
+        # Memoiza o usuário no contexto da requisição (g é descartado ao fim
+        # dela): um único SELECT por requisição
+        user = g.get('user')
+        if user is not None and user.id == user_id:
+            return user
         from app.models import User
-        return User.query.get(int(user_id))
+        
+        # Com sessões no servidor, reconstrói o usuário a partir do snapshot
+        # salvo no login, sem consultar o banco
+        cached = session.get('_user_cache')
+        if cached and cached['id'] == user_id:
+            user = User(**cached)
+            make_transient_to_detached(user)
+            g.user = db.session.merge(user, load=False)
+        else:
+            # Busca pela chave primária, consultando antes o identity map
+            g.user = db.session.get(User, user_id)
+        return g.user
     
     # Registrar blueprints
     from app.routes.main import main_bp
@@ -68,6 +117,14 @@ def create_app(config_name=None):
     app.register_blueprint(cart_bp, url_prefix='/api/cart')
     app.register_blueprint(orders_bp, url_prefix='/api/orders')
     
+    # Contagem de consultas por requisição (detecção de N+1 em testes)
+    if app.config.get('SQLALCHEMY_COUNT_QUERIES'):
+        register_query_counter(app)
+    
+    # Registro de consultas lentas (substitui o echo de todas as instruções)
+    if app.config.get('SLOW_QUERY_THRESHOLD'):
+        register_slow_query_log(app)
+    
     # Criar tabelas do banco de dados
     with app.app_context():
         db.create_all()
@@ -78,80 +135,125 @@ def create_app(config_name=None):
     return app
 
 
+def register_query_counter(app):
+    """
+    Conta as consultas SQL executadas em cada requisição
+    
+    O total é devolvido no cabeçalho X-Query-Count, permitindo que os testes
+    verifiquem que uma rota não passou a emitir consultas extras. Em respostas
+    enviadas em partes (streaming), o cabeçalho só inclui as consultas feitas
+    antes do início do envio.
+    
+    Args:
+        app (Flask): Instância da aplicação
+    """
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+    
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+    
+    @app.after_request
+    def add_query_count_header(response):
+        response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+        return response
+
+
+def register_slow_query_log(app):
+    """
+    Registra no log da aplicação as consultas SQL que excedem o limite
+    
+    Apenas o tempo de cada execução é medido; o texto da instrução só é
+    formatado para as consultas lentas, e os parâmetros não são registrados.
+    
+    Args:
+        app (Flask): Instância da aplicação
+    """
+    threshold = app.config['SLOW_QUERY_THRESHOLD']
+    
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_start_time'] = time.perf_counter()
+    
+    def log_slow_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start_time']
+        if elapsed >= threshold:
+            app.logger.warning('Consulta lenta (%.1f ms): %s', elapsed * 1000, statement)
+    
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', start_timer)
+        event.listen(db.engine, 'after_cursor_execute', log_slow_query)
+
+
 def create_initial_data():
     """
     Cria dados iniciais no banco de dados se ele estiver vazio
+    
+    Os dados são inseridos em lote (bulk_insert_mappings) e gravados em uma
+    única transação.
     """
     from app.models import Category, Product, User
     
-    # Verificar se já existem categorias
-    if Category.query.count() == 0:
+    # Verificar se já existem categorias (EXISTS: para no primeiro registro)
+    if not db.session.scalar(db.select(db.select(Category.id).exists())):
         # Criar categorias padrão
-        categories = [
-            Category(name='Eletrônicos', description='Produtos eletrônicos e gadgets'),
-            Category(name='Roupas', description='Vestuário e acessórios'),
-            Category(name='Casa', description='Itens para casa e decoração'),
-            Category(name='Livros', description='Livros e materiais educativos'),
-            Category(name='Esportes', description='Equipamentos esportivos e fitness')
-        ]
-        
-        for category in categories:
-            db.session.add(category)
+        db.session.bulk_insert_mappings(Category, [
+            {'name': 'Eletrônicos', 'description': 'Produtos eletrônicos e gadgets'},
+            {'name': 'Roupas', 'description': 'Vestuário e acessórios'},
+            {'name': 'Casa', 'description': 'Itens para casa e decoração'},
+            {'name': 'Livros', 'description': 'Livros e materiais educativos'},
+            {'name': 'Esportes', 'description': 'Equipamentos esportivos e fitness'}
+        ])
         
-        db.session.commit()
+        # Buscar os IDs das categorias dos produtos de exemplo em uma única consulta
+        category_ids = dict(
+            db.session.execute(
+                db.select(Category.name, Category.id)
+                .where(Category.name.in_(['Eletrônicos', 'Roupas']))
+            ).all()
+        )
+        electronics_id = category_ids['Eletrônicos']
+        clothes_id = category_ids['Roupas']
         
         # Criar produtos de exemplo
-        electronics = Category.query.filter_by(name='Eletrônicos').first()
-        clothes = Category.query.filter_by(name='Roupas').first()
-        
-        products = [
-            Product(
-                name='Smartphone XYZ',
-                description='Smartphone com 128GB de armazenamento',
-                price=899.99,
-                stock=50,
-                category_id=electronics.id
-            ),
-            Product(
-                name='Notebook ABC',
-                description='Notebook para trabalho e estudos',
-                price=2499.99,
-                stock=25,
-                category_id=electronics.id
-            ),
-            Product(
-                name='Camiseta Básica',
-                description='Camiseta 100% algodão',
-                price=29.99,
-                stock=100,
-                category_id=clothes.id
-            ),
-            Product(
-                name='Jeans Premium',
-                description='Calça jeans de alta qualidade',
-                price=89.99,
-                stock=75,
-                category_id=clothes.id
-            )
-        ]
-        
-        for product in products:
-            db.session.add(product)
-        
-        db.session.commit()
+        db.session.bulk_insert_mappings(Product, [
+            {
+                'name': 'Smartphone XYZ',
+                'description': 'Smartphone com 128GB de armazenamento',
+                'price': 899.99,
+                'stock': 50,
+                'category_id': electronics_id
+            },
+            {
+                'name': 'Notebook ABC',
+                'description': 'Notebook para trabalho e estudos',
+                'price': 2499.99,
+                'stock': 25,
+                'category_id': electronics_id
+            },
+            {
+                'name': 'Camiseta Básica',
+                'description': 'Camiseta 100% algodão',
+                'price': 29.99,
+                'stock': 100,
+                'category_id': clothes_id
+            },
+            {
+                'name': 'Jeans Premium',
+                'description': 'Calça jeans de alta qualidade',
+                'price': 89.99,
+                'stock': 75,
+                'category_id': clothes_id
+            }
+        ])
     
     # Criar usuário admin se não existir
-    if User.query.filter_by(username='admin').first() is None:
+    if not db.session.scalar(db.select(db.select(User.id).filter_by(username='admin').exists())):
         admin_user = User(
             username='admin',
             email='admin@example.com'
         )
         admin_user.set_password('admin123')
         db.session.add(admin_user)
-        db.session.commit()
-
-
-def get_models():
-    """Retorna os modelos da aplicação"""
-    from app.models import get_all_models
-    return get_all_models()
+    
+    db.session.commit()
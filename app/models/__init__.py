@@ -5,6 +5,9 @@ Este módulo centraliza a importação de todos os modelos de dados
 da aplicação, facilitando o acesso e a organização.
 """
 
+from flask import current_app
+from sqlalchemy.orm import raiseload
+
 # Importar todos os modelos
 from .user import User
 from .category import Category
@@ -40,6 +43,25 @@ def get_all_models():
     }
 
 
+def loader_options(*options):
+    """
+    Monta as opções de carregamento de uma consulta
+    
+    Com SQLALCHEMY_RAISELOAD habilitado (testes), acrescenta raiseload('*') às
+    opções, de modo que o acesso a um relacionamento que não foi carregado
+    explicitamente gere erro em vez de uma consulta extra por linha (N+1).
+    
+    Args:
+        *options: Opções de carregamento (selectinload, joinedload, ...)
+        
+    Returns:
+        tuple: Opções a serem passadas para Query.options()
+    """
+    if current_app.config.get('SQLALCHEMY_RAISELOAD'):
+        return options + (raiseload('*', sql_only=True),)
+    return options
+
+
 # Manter compatibilidade com a função create_models existente
 def create_models(db):
     """
@@ -2,7 +2,18 @@
 Modelo de carrinho para a aplicação E-commerce
 """
 from datetime import datetime
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from app import db
+from app.models.product import Product
+
+# Construtores de INSERT com suporte a ON CONFLICT, por dialeto
+_UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+# Dialetos com INSERT ... ON DUPLICATE KEY UPDATE (sem RETURNING)
+_DUPLICATE_KEY_DIALECTS = ('mysql', 'mariadb')
 
 
 class CartItem(db.Model):
@@ -15,6 +26,8 @@ class CartItem(db.Model):
         product_id (int): ID do produto no carrinho
         quantity (int): Quantidade do produto (padrão: 1)
         created_at (datetime): Data de criação
+        user (relationship): Usuário proprietário do carrinho
+        product (relationship): Produto do item
     """
     __tablename__ = 'cart_items'
     
@@ -24,7 +37,12 @@ class CartItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False, default=1)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
-    # Constraint para evitar duplicatas
+    # Relacionamentos (o produto é sempre serializado junto com o item)
+    user = db.relationship('User', back_populates='cart', lazy='select')
+    product = db.relationship('Product', back_populates='cart_items', lazy='selectin')
+    
+    # Constraint para evitar duplicatas (o índice único também atende as
+    # buscas por user_id e por (user_id, product_id) das rotas do carrinho)
     __table_args__ = (db.UniqueConstraint('user_id', 'product_id', name='unique_user_product'),)
 
     def __repr__(self):
@@ -42,12 +60,115 @@ class CartItem(db.Model):
             'user_id': self.user_id,
             'product_id': self.product_id,
             'product_name': self.product.name if self.product else None,
-            'product_price': float(self.product.price) if self.product else 0,
+            'product_price': self.product.price if self.product else 0,
             'quantity': self.quantity,
             'total_price': self.get_total_price(),
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
     
+    @classmethod
+    def add_quantity(cls, user_id, product_id, quantity, max_quantity):
+        """
+        Adiciona uma quantidade do produto ao carrinho do usuário
+        
+        Cria o item ou incrementa a quantidade existente em um único
+        INSERT ... ON CONFLICT DO UPDATE, sem consultar o item antes. No MySQL,
+        usa INSERT ... ON DUPLICATE KEY UPDATE seguido da leitura do item. Em
+        dialetos sem nenhum desses recursos, consulta e atualiza o item.
+        
+        Quando o retorno é None a sessão pode conter alterações parciais;
+        cabe a quem chamou desfazer a transação.
+        
+        Args:
+            user_id (int): ID do usuário
+            product_id (int): ID do produto
+            quantity (int): Quantidade a ser adicionada
+            max_quantity (int): Quantidade total máxima permitida (estoque)
+            
+        Returns:
+            CartItem: Item resultante, ou None se a quantidade total exceder max_quantity
+        """
+        dialect = db.session.get_bind().dialect.name
+        
+        if dialect in _DUPLICATE_KEY_DIALECTS:
+            # Sem WHERE no UPDATE nem RETURNING: incrementa e confere o
+            # resultado na linha, que permanece bloqueada até o fim da transação
+            stmt = mysql.insert(cls).values(user_id=user_id, product_id=product_id, quantity=quantity)
+            db.session.execute(stmt.on_duplicate_key_update(
+                quantity=cls.quantity + stmt.inserted.quantity
+            ))
+            item = db.session.scalars(
+                db.select(cls).filter_by(user_id=user_id, product_id=product_id),
+                execution_options={'populate_existing': True}
+            ).one()
+            return item if item.quantity <= max_quantity else None
+        
+        insert = _UPSERT_INSERTS.get(dialect)
+        
+        if insert is None:
+            item = db.session.scalars(
+                db.select(cls).filter_by(user_id=user_id, product_id=product_id)
+            ).first()
+            if item is None:
+                item = cls(user_id=user_id, product_id=product_id, quantity=0)
+                db.session.add(item)
+            if item.quantity + quantity > max_quantity:
+                return None
+            item.quantity += quantity
+            db.session.flush()
+            return item
+        
+        stmt = insert(cls).values(user_id=user_id, product_id=product_id, quantity=quantity)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'product_id'],
+            set_={'quantity': cls.quantity + stmt.excluded.quantity},
+            where=(cls.quantity + stmt.excluded.quantity) <= max_quantity
+        ).returning(cls)
+        
+        return db.session.scalars(
+            stmt, execution_options={'populate_existing': True}
+        ).first()
+    
+    @classmethod
+    def set_quantity(cls, user_id, product_id, quantity):
+        """
+        Define a quantidade de um item existente no carrinho
+        
+        A verificação de estoque fica no WHERE do próprio UPDATE: a linha só é
+        alterada se o produto estiver ativo e com estoque suficiente, sem
+        carregar item ou produto antes.
+        
+        Args:
+            user_id (int): ID do usuário
+            product_id (int): ID do produto
+            quantity (int): Nova quantidade
+            
+        Returns:
+            CartItem: Item atualizado, ou None se o item não existir ou o
+                estoque for insuficiente
+        """
+        in_stock = db.select(Product.id).where(
+            Product.id == cls.product_id,
+            Product.stock >= quantity,
+            Product.is_active == True
+        ).exists()
+        stmt = db.update(cls).where(
+            cls.user_id == user_id,
+            cls.product_id == product_id,
+            in_stock
+        ).values(quantity=quantity)
+        options = {'synchronize_session': False, 'populate_existing': True}
+        
+        if db.session.get_bind().dialect.update_returning:
+            return db.session.scalars(stmt.returning(cls), execution_options=options).first()
+        
+        if db.session.execute(stmt, execution_options=options).rowcount == 0:
+            return None
+        return db.session.scalars(
+            db.select(cls).filter_by(user_id=user_id, product_id=product_id),
+            execution_options=options
+        ).one()
+    
     def get_total_price(self):
         """
         Calcula o preço total do item (preço unitário * quantidade)
@@ -56,5 +177,6 @@ class CartItem(db.Model):
             float: Preço total do item
         """
         if self.product:
-            return float(self.product.price) * self.quantity
+            # Cálculo em centavos inteiros, sem erro de arredondamento de float
+            return self.product.price_cents * self.quantity / 100
         return 0.0
@@ -24,7 +24,7 @@ class Category(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
     # Relacionamentos
-    products = db.relationship('Product', backref='category', lazy=True)
+    products = db.relationship('Product', back_populates='category', lazy='select')
 
     def __repr__(self):
         return f'<Category {self.name}>'
@@ -40,6 +40,6 @@ class Category(db.Model):
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'created_at': self.created_at.isoformat(),
+            'created_at': self.created_at,
             'products_count': len(self.products)
         }
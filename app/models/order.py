@@ -16,6 +16,7 @@ class Order(db.Model):
         status (str): Status do pedido
         created_at (datetime): Data de criação do pedido
         updated_at (datetime): Data de última atualização
+        user (relationship): Usuário que fez o pedido
         items (relationship): Relacionamento com itens do pedido
     """
     __tablename__ = 'orders'
@@ -34,8 +35,16 @@ class Order(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    # Relacionamentos
-    items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
+    # Relacionamentos (os itens são sempre serializados junto com o pedido)
+    user = db.relationship('User', back_populates='orders', lazy='select')
+    items = db.relationship('OrderItem', back_populates='order', lazy='selectin', cascade='all, delete-orphan')
+    
+    # Índices compostos da listagem de pedidos do usuário: paginação por cursor
+    # em (created_at, id), com e sem filtro de status, lida já na ordem do índice
+    __table_args__ = (
+        db.Index('ix_order_user_status_created', 'user_id', 'status', 'created_at', 'id'),
+        db.Index('ix_order_user_created', 'user_id', 'created_at', 'id'),
+    )
 
     def __repr__(self):
         return f'<Order {self.id} - {self.status}>'
@@ -52,16 +61,18 @@ class Order(db.Model):
         Returns:
             dict: Dados do pedido
         """
+        # Itens serializados uma única vez; a quantidade total sai da mesma lista
+        items = [item.to_dict() for item in self.items]
         return {
             'id': self.id,
             'user_id': self.user_id,
             'username': self.user.username if self.user else None,
-            'total': float(self.total),
+            'total': self.total,
             'status': self.status,
-            'items_count': self.items_count,
-            'items': [item.to_dict() for item in self.items],
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'items_count': sum(item['quantity'] for item in items),
+            'items': items,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
     def calculate_total(self):
@@ -86,14 +97,20 @@ class OrderItem(db.Model):
         product_id (int): ID do produto
         quantity (int): Quantidade do produto
         price (decimal): Preço unitário no momento do pedido
+        order (relationship): Pedido ao qual o item pertence
+        product (relationship): Produto do item
     """
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(10, 2), nullable=False)  # Preço no momento do pedido
+    
+    # Relacionamentos
+    order = db.relationship('Order', back_populates='items', lazy='select')
+    product = db.relationship('Product', back_populates='order_items', lazy='selectin')
 
     def __repr__(self):
         return f'<OrderItem Order:{self.order_id} Product:{self.product_id}>'
@@ -111,7 +128,7 @@ class OrderItem(db.Model):
             'product_id': self.product_id,
             'product_name': self.product.name if self.product else None,
             'quantity': self.quantity,
-            'price': float(self.price),
+            'price': self.price,
             'total_price': self.get_total_price()
         }
     
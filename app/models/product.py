@@ -2,6 +2,8 @@
 Modelo de produto para a aplicação E-commerce
 """
 from datetime import datetime
+from sqlalchemy import DDL, event
+from sqlalchemy.ext.hybrid import hybrid_property
 from app import db
 
 
@@ -19,6 +21,7 @@ class Product(db.Model):
         is_active (bool): Status ativo do produto
         created_at (datetime): Data de criação
         updated_at (datetime): Data de última atualização
+        category (relationship): Categoria do produto
         cart_items (relationship): Relacionamento com itens do carrinho
         order_items (relationship): Relacionamento com itens de pedidos
     """
@@ -34,13 +37,41 @@ class Product(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    # Relacionamentos
-    cart_items = db.relationship('CartItem', backref='product', lazy=True, cascade='all, delete-orphan')
-    order_items = db.relationship('OrderItem', backref='product', lazy=True)
+    # Relacionamentos (os lados reversos quase nunca são percorridos a partir
+    # do produto; lazy='raise' denuncia acessos acidentais em vez de gerar N+1)
+    category = db.relationship('Category', back_populates='products', lazy='select')
+    cart_items = db.relationship('CartItem', back_populates='product', lazy='raise', cascade='all, delete-orphan')
+    order_items = db.relationship('OrderItem', back_populates='product', lazy='raise')
+    
+    # Índice parcial da listagem por categoria: apenas produtos ativos, já na
+    # ordem da paginação por id
+    __table_args__ = (
+        db.Index(
+            'ix_products_active_category', 'category_id', 'id',
+            postgresql_where=db.text('is_active'),
+            sqlite_where=db.text('is_active = 1')
+        ),
+    )
 
     def __repr__(self):
         return f'<Product {self.name}>'
     
+    @hybrid_property
+    def price_cents(self):
+        """
+        Preço do produto em centavos (inteiro)
+        
+        Também pode ser usado em consultas, onde é calculado pelo banco.
+        
+        Returns:
+            int: Preço em centavos
+        """
+        return int(round(self.price * 100))
+    
+    @price_cents.expression
+    def price_cents(cls):
+        return db.cast(db.func.round(cls.price * 100), db.Integer)
+    
     def to_dict(self):
         """
         Converte o objeto Product para dicionário
@@ -52,13 +83,13 @@ class Product(db.Model):
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'price': float(self.price),
+            'price': self.price,
             'stock': self.stock,
             'category_id': self.category_id,
             'category_name': self.category.name if self.category else None,
             'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
     def is_available(self, quantity=1):
@@ -87,3 +118,20 @@ class Product(db.Model):
             self.stock -= quantity
             return True
         return False
+
+
+# Índice GIN de trigramas no PostgreSQL: atende à busca por substring
+# (name ILIKE '%termo%'), que não aproveita o índice btree de name
+event.listen(
+    Product.__table__,
+    'after_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+event.listen(
+    Product.__table__,
+    'after_create',
+    DDL(
+        'CREATE INDEX IF NOT EXISTS ix_products_name_trgm '
+        'ON products USING gin (name gin_trgm_ops)'
+    ).execute_if(dialect='postgresql')
+)
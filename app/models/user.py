@@ -1,11 +1,22 @@
 """
 Modelo de usuário para a aplicação E-commerce
 """
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from datetime import datetime
 from app import db
 
+# Argon2id com os parâmetros recomendados pela OWASP (46 MiB, t=2, p=1)
+_password_hasher = PasswordHasher(time_cost=2, memory_cost=46 * 1024, parallelism=1)
+
+# Prefixos dos hashes gerados anteriormente pelo Werkzeug
+_WERKZEUG_HASH_PREFIXES = ('pbkdf2:', 'scrypt:')
+
+# Hash de referência usado quando o usuário não existe (gerado no primeiro uso)
+_dummy_password_hash = None
+
 
 class User(db.Model, UserMixin):
     """
@@ -30,9 +41,9 @@ class User(db.Model, UserMixin):
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
-    # Relacionamentos
-    cart = db.relationship('CartItem', backref='user', lazy=True, cascade='all, delete-orphan')
-    orders = db.relationship('Order', backref='user', lazy=True)
+    # Relacionamentos (o carrinho é sempre consultado diretamente em CartItem)
+    cart = db.relationship('CartItem', back_populates='user', lazy='raise', cascade='all, delete-orphan')
+    orders = db.relationship('Order', back_populates='user', lazy='select')
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -44,19 +55,76 @@ class User(db.Model, UserMixin):
         Args:
             password (str): Senha em texto plano
         """
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = _password_hasher.hash(password)
     
     def check_password(self, password):
         """
         Verifica se a senha fornecida está correta
         
+        Hashes antigos do Werkzeug (PBKDF2/scrypt) ainda são aceitos. Quando a
+        senha confere e o hash está desatualizado, ele é refeito com os
+        parâmetros atuais; cabe a quem chamou persistir a alteração.
+        
         Args:
             password (str): Senha em texto plano
             
         Returns:
             bool: True se a senha estiver correta
         """
-        return check_password_hash(self.password_hash, password)
+        if self.password_hash.startswith(_WERKZEUG_HASH_PREFIXES):
+            if not check_password_hash(self.password_hash, password):
+                return False
+        else:
+            try:
+                _password_hasher.verify(self.password_hash, password)
+            except (VerificationError, InvalidHashError):
+                return False
+            if not _password_hasher.check_needs_rehash(self.password_hash):
+                return True
+        
+        self.set_password(password)
+        return True
+    
+    @staticmethod
+    def check_dummy_password(password):
+        """
+        Executa uma verificação de senha descartável
+        
+        Usada no login quando o usuário não existe, para que o custo do Argon2
+        seja o mesmo de uma tentativa com usuário válido.
+        
+        Args:
+            password (str): Senha em texto plano
+            
+        Returns:
+            bool: Sempre False
+        """
+        global _dummy_password_hash
+        if _dummy_password_hash is None:
+            _dummy_password_hash = _password_hasher.hash(secrets.token_urlsafe(16))
+        try:
+            _password_hasher.verify(_dummy_password_hash, password)
+        except (VerificationError, InvalidHashError):
+            pass
+        return False
+    
+    def to_session_cache(self):
+        """
+        Gera o snapshot do usuário armazenado na sessão do servidor
+        
+        Contém apenas colunas públicas; a senha hasheada é carregada do banco
+        sob demanda caso seja acessada.
+        
+        Returns:
+            dict: Colunas do usuário
+        """
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email,
+            'is_active': self.is_active,
+            'created_at': self.created_at
+        }
     
     def to_dict(self):
         """
@@ -70,5 +138,5 @@ class User(db.Model, UserMixin):
             'username': self.username,
             'email': self.email,
             'is_active': self.is_active,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
@@ -4,15 +4,49 @@ Rotas de autenticação da API
 Este módulo contém todas as rotas relacionadas à autenticação de usuários,
 incluindo registro, login, logout e gerenciamento de sessões.
 """
-from flask import Blueprint, request, jsonify, current_app
+import re
+import time
+
+from flask import Blueprint, Response, request, jsonify, current_app, session, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash
+from sqlalchemy import bindparam, or_
 
-from app import db, get_models
+from app import db
+from app.models import User
 
 # Criar blueprint para rotas de autenticação
 auth_bp = Blueprint('auth', __name__)
 
+# Instruções reutilizadas a cada requisição (SQL compilado uma única vez)
+_select_login_user = db.select(User).where(
+    or_(User.username == bindparam('login'), User.email == bindparam('login'))
+).limit(1)
+
+# Página da listagem de usuários (paginação por chave: id > after)
+_select_users_page = db.select(User).where(
+    User.id > bindparam('after')
+).order_by(User.id).limit(bindparam('limit'))
+
+# Tamanho padrão e máximo da página de usuários
+_USERS_PAGE_SIZE = 50
+_MAX_USERS_PAGE_SIZE = 500
+
+# Limites de tamanho das credenciais aceitas no login (username/email e senha);
+# entradas maiores são recusadas sem consultar o banco nem calcular o hash
+_MAX_LOGIN_LENGTH = 120
+_MAX_PASSWORD_LENGTH = 1024
+
+# Formato aceito para emails no registro (limitado ao tamanho da coluna)
+_EMAIL_RE = re.compile(r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$')
+_MAX_EMAIL_LENGTH = 120
+
+# Campos obrigatórios do registro (todos devem ser strings)
+_REGISTER_FIELDS = frozenset(('username', 'email', 'password'))
+
+_select_existing_users = db.select(User.username, User.email).where(
+    or_(User.username == bindparam('username'), User.email == bindparam('email'))
+)
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """
@@ -27,33 +61,39 @@ def register():
         JSON: Dados do usuário criado ou erro
     """
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         
-        if not data:
+        if not data or not isinstance(data, dict):
             return jsonify({'error': 'Dados não fornecidos'}), 400
         
-        username = data.get('username', '').strip()
-        email = data.get('email', '').strip()
-        password = data.get('password', '')
+        if not _REGISTER_FIELDS.issubset(data) or not all(
+            isinstance(data[field], str) for field in _REGISTER_FIELDS
+        ):
+            return jsonify({'error': 'Username, email e senha são obrigatórios'}), 400
+        
+        username = data['username'].strip()
+        email = data['email'].strip()
+        password = data['password']
         
         # Validações
         if not username or len(username) < 3:
             return jsonify({'error': 'Username deve ter pelo menos 3 caracteres'}), 400
         
-        if not email or '@' not in email:
+        if len(email) > _MAX_EMAIL_LENGTH or not _EMAIL_RE.match(email):
             return jsonify({'error': 'Email inválido'}), 400
         
         if not password or len(password) < 6:
             return jsonify({'error': 'Senha deve ter pelo menos 6 caracteres'}), 400
         
-        models = get_models()
-        User = models['User']
+        # Verificar se usuário já existe (username e email em uma única consulta)
+        existing = db.session.execute(
+            _select_existing_users, {'username': username, 'email': email}
+        ).all()
         
-        # Verificar se usuário já existe
-        if User.query.filter_by(username=username).first():
+        if any(row.username == username for row in existing):
             return jsonify({'error': 'Username já existe'}), 409
         
-        if User.query.filter_by(email=email).first():
+        if existing:
             return jsonify({'error': 'Email já está em uso'}), 409
         
         # Criar novo usuário
@@ -83,13 +123,17 @@ def login():
         - username (str): Nome de usuário ou email
         - password (str): Senha do usuário
     
+    Todas as respostas levam ao menos LOGIN_MIN_DURATION segundos, de modo que
+    o tempo de resposta não revela se o usuário existe.
+    
     Returns:
         JSON: Dados do usuário logado ou erro
     """
+    started = time.perf_counter()
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         
-        if not data:
+        if not data or not isinstance(data, dict):
             return jsonify({'error': 'Dados não fornecidos'}), 400
         
         username = data.get('username', '').strip()
@@ -98,23 +142,34 @@ def login():
         if not username or not password:
             return jsonify({'error': 'Username e senha são obrigatórios'}), 400
         
-        models = get_models()
-        User = models['User']
+        if len(username) > _MAX_LOGIN_LENGTH or len(password) > _MAX_PASSWORD_LENGTH:
+            return jsonify({'error': 'Credenciais inválidas'}), 401
         
         # Buscar usuário por username ou email
-        user = User.query.filter(
-            (User.username == username) | (User.email == username)
-        ).first()
+        user = db.session.scalars(_select_login_user, {'login': username}).first()
+        
+        if not user:
+            # Mesmo custo de hash de um usuário existente
+            User.check_dummy_password(password)
+            return jsonify({'error': 'Credenciais inválidas'}), 401
         
-        if not user or not user.check_password(password):
+        if not user.check_password(password):
             return jsonify({'error': 'Credenciais inválidas'}), 401
         
         if not user.is_active:
             return jsonify({'error': 'Conta desativada'}), 403
         
+        # Persistir o hash refeito por check_password (migração de hashes antigos)
+        if db.session.is_modified(user):
+            db.session.commit()
+        
         # Fazer login
         login_user(user)
         
+        # Snapshot do usuário para o user_loader (apenas com sessões no servidor)
+        if current_app.config.get('SESSION_TYPE'):
+            session['_user_cache'] = user.to_session_cache()
+        
         return jsonify({
             'message': 'Login realizado com sucesso',
             'user': user.to_dict()
@@ -123,6 +178,10 @@ def login():
     except Exception as e:
         current_app.logger.error(f'Erro no login: {str(e)}')
         return jsonify({'error': 'Erro interno do servidor'}), 500
+    finally:
+        remaining = current_app.config['LOGIN_MIN_DURATION'] - (time.perf_counter() - started)
+        if remaining > 0:
+            time.sleep(remaining)
 
 
 @auth_bp.route('/logout', methods=['POST'])
@@ -136,6 +195,7 @@ def logout():
     """
     try:
         logout_user()
+        session.pop('_user_cache', None)
         return jsonify({'message': 'Logout realizado com sucesso'}), 200
         
     except Exception as e:
@@ -162,25 +222,70 @@ def get_current_user():
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 
+def _stream_users(users, limit):
+    """
+    Gera o JSON de uma página da listagem de usuários em partes
+    
+    Args:
+        users (list): Usuários da página, já carregados
+        limit (int): Tamanho da página
+    
+    Yields:
+        bytes: Fragmentos do documento {"users": [...], "total": N, "next_after": ID}
+    """
+    encode = current_app.json.encode
+    total = 0
+    last_id = None
+    
+    yield b'{"users":['
+    try:
+        for user in users:
+            yield (b',' if total else b'') + encode(user.to_dict())
+            total += 1
+            last_id = user.id
+    except Exception as e:
+        # O status já foi enviado: registrar e interromper a resposta, para que
+        # o cliente não receba um documento truncado como se estivesse completo
+        current_app.logger.error(f'Erro ao listar usuários: {str(e)}')
+        raise
+    
+    # Página incompleta: não há próxima página
+    next_after = last_id if total == limit else None
+    yield b'],"total":' + str(total).encode() + b',"next_after":' + encode(next_after) + b'}'
+
+
 @auth_bp.route('/users', methods=['GET'])
 @login_required
 def list_users():
     """
-    Lista todos os usuários (apenas para demonstração)
+    Lista os usuários em páginas (apenas para demonstração)
+    
+    A paginação é por chave (id), com custo constante em qualquer página, e a
+    resposta é enviada em partes, sem montar o documento JSON completo em memória.
+    
+    Query Parameters:
+        - after (int): Retorna usuários com ID maior que este (padrão: 0)
+        - limit (int): Itens por página (padrão: 50, máximo: 500)
     
     Returns:
-        JSON: Lista de usuários
+        JSON: Página de usuários e o valor de after da próxima página
     """
     try:
-        models = get_models()
-        User = models['User']
+        after = request.args.get('after', 0, type=int)
+        limit = request.args.get('limit', _USERS_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, _MAX_USERS_PAGE_SIZE))
         
-        users = User.query.all()
+        # Página (no máximo _MAX_USERS_PAGE_SIZE linhas) carregada por completo
+        # antes da resposta: falhas do banco chegam ao tratamento de erro
+        # abaixo (500) e next_after só é calculado sobre uma página completa
+        users = db.session.scalars(
+            _select_users_page, {'after': after, 'limit': limit}
+        ).all()
         
-        return jsonify({
-            'users': [user.to_dict() for user in users],
-            'total': len(users)
-        }), 200
+        return Response(
+            stream_with_context(_stream_users(users, limit)),
+            mimetype='application/json'
+        )
         
     except Exception as e:
         current_app.logger.error(f'Erro ao listar usuários: {str(e)}')
@@ -6,11 +6,69 @@ incluindo adicionar, remover, atualizar e finalizar compra.
 """
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
-from app import db, get_models
+from sqlalchemy import bindparam, func, lambda_stmt
+from app import db, tasks
+from app.models import CartItem, Product
 
 # Criar blueprint para rotas do carrinho
 cart_bp = Blueprint('cart', __name__)
 
+# Instruções das rotas mais frequentes: com lambda_stmt a construção e a
+# compilação do SQL ficam em cache, e cada requisição só fornece os parâmetros
+_select_cart_rows = lambda_stmt(lambda: db.select(
+    CartItem.id,
+    CartItem.user_id,
+    CartItem.product_id,
+    Product.name.label('product_name'),
+    Product.price.label('product_price'),
+    Product.price_cents.label('price_cents'),
+    CartItem.quantity,
+    CartItem.created_at
+).outerjoin(Product, Product.id == CartItem.product_id).where(
+    CartItem.user_id == bindparam('user_id')
+))
+
+_select_cart_item_id = lambda_stmt(lambda: db.select(CartItem.id).where(
+    CartItem.user_id == bindparam('user_id'),
+    CartItem.product_id == bindparam('product_id')
+))
+
+_select_cart_totals = lambda_stmt(lambda: db.select(
+    func.coalesce(func.sum(Product.price_cents * CartItem.quantity), 0),
+    func.coalesce(func.sum(CartItem.quantity), 0),
+    func.count(CartItem.id)
+).select_from(CartItem).join(Product, Product.id == CartItem.product_id).where(
+    CartItem.user_id == bindparam('user_id')
+))
+
+_delete_cart_item = lambda_stmt(lambda: db.delete(CartItem).where(
+    CartItem.user_id == bindparam('user_id'),
+    CartItem.product_id == bindparam('product_id')
+))
+
+
+def _serialize_cart_row(row):
+    """
+    Converte uma linha da projeção do carrinho no mesmo formato de CartItem.to_dict
+    
+    Args:
+        row (RowMapping): Linha retornada pela consulta Core
+        
+    Returns:
+        dict: Dados do item do carrinho
+    """
+    price = row['product_price']
+    return {
+        'id': row['id'],
+        'user_id': row['user_id'],
+        'product_id': row['product_id'],
+        'product_name': row['product_name'],
+        'product_price': price if price is not None else 0,
+        'quantity': row['quantity'],
+        'total_price': row['price_cents'] * row['quantity'] / 100 if price is not None else 0.0,
+        'created_at': row['created_at']
+    }
+
 
 @cart_bp.route('/', methods=['GET'])
 @login_required
@@ -22,13 +80,13 @@ def get_cart():
         JSON: Lista de itens no carrinho com detalhes dos produtos
     """
     try:
-        models = get_models()
-        CartItem = models['CartItem']
-        
-        cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
+        # Projeção Core com o produto já juntado: uma única consulta, sem objetos ORM
+        rows = db.session.execute(
+            _select_cart_rows, {'user_id': current_user.id}
+        ).mappings().all()
         return jsonify({
             'success': True,
-            'data': [item.to_dict() for item in cart_items]
+            'data': [_serialize_cart_row(row) for row in rows]
         }), 200
     except Exception as e:
         return jsonify({
@@ -53,11 +111,7 @@ def add_to_cart(product_id):
         JSON: Resposta com status da operação
     """
     try:
-        models = get_models()
-        Product = models['Product']
-        CartItem = models['CartItem']
-        
-        product = Product.query.get(product_id)
+        product = db.session.get(Product, product_id)
         if not product:
             return jsonify({
                 'success': False,
@@ -80,44 +134,46 @@ def add_to_cart(product_id):
                 'message': 'Produto sem estoque suficiente'
             }), 400
         
-        # Verificar se o item já existe no carrinho
-        existing_item = CartItem.query.filter_by(
-            user_id=current_user.id, 
-            product_id=product_id
-        ).first()
-        
-        if existing_item:
-            # Se já existe, verificar se a nova quantidade total não excede o estoque
-            new_total_quantity = existing_item.quantity + quantity
-            if not product.is_available(new_total_quantity):
-                return jsonify({
-                    'success': False,
-                    'message': 'Quantidade total excede o estoque disponível'
-                }), 400
-            
-            existing_item.quantity = new_total_quantity
-            db.session.commit()
-            
+        # Com a fila habilitada, a gravação é feita pelo worker
+        queue = tasks.get_queue()
+        if queue is not None:
+            job = queue.enqueue(tasks.add_to_cart, current_user.id, product_id, quantity)
             return jsonify({
                 'success': True,
-                'message': 'Quantidade do produto atualizada no carrinho',
-                'data': existing_item.to_dict()
-            }), 200
-        else:
-            # Se não existe, criar novo item
-            cart_item = CartItem(
-                user_id=current_user.id, 
-                product_id=product_id,
-                quantity=quantity
-            )
-            db.session.add(cart_item)
-            db.session.commit()
-            
+                'message': 'Adição ao carrinho enfileirada',
+                'data': {'status': 'queued', 'job_id': job.id}
+            }), 202
+        
+        # Criar o item ou somar à quantidade existente (UPSERT), limitado ao estoque
+        cart_item = CartItem.add_quantity(
+            current_user.id,
+            product_id,
+            quantity,
+            max_quantity=product.stock
+        )
+        
+        if cart_item is None:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': 'Quantidade total excede o estoque disponível'
+            }), 400
+        
+        db.session.commit()
+        
+        # Quantidade igual à adicionada: o item acabou de ser criado
+        if cart_item.quantity == quantity:
             return jsonify({
                 'success': True,
                 'message': 'Produto adicionado ao carrinho',
                 'data': cart_item.to_dict()
             }), 201
+        
+        return jsonify({
+            'success': True,
+            'message': 'Quantidade do produto atualizada no carrinho',
+            'data': cart_item.to_dict()
+        }), 200
             
     except Exception as e:
         db.session.rollback()
@@ -140,21 +196,20 @@ def remove_from_cart(product_id):
         JSON: Resposta com status da operação
     """
     try:
-        models = get_models()
-        CartItem = models['CartItem']
+        # DELETE direto; nenhuma linha afetada significa que o item não existe
+        result = db.session.execute(
+            _delete_cart_item,
+            {'user_id': current_user.id, 'product_id': product_id},
+            execution_options={'synchronize_session': False}
+        )
         
-        cart_item = CartItem.query.filter_by(
-            user_id=current_user.id, 
-            product_id=product_id
-        ).first()
-        
-        if not cart_item:
+        if result.rowcount == 0:
+            db.session.rollback()
             return jsonify({
                 'success': False,
                 'message': 'Item não encontrado no carrinho'
             }), 404
         
-        db.session.delete(cart_item)
         db.session.commit()
         
         return jsonify({
@@ -200,35 +255,35 @@ def update_cart_item(product_id):
                 'message': 'Quantidade deve ser um número inteiro positivo'
             }), 400
         
-        models = get_models()
-        CartItem = models['CartItem']
-        Product = models['Product']
-        
-        cart_item = CartItem.query.filter_by(
-            user_id=current_user.id, 
-            product_id=product_id
-        ).first()
-        
-        if not cart_item:
-            return jsonify({
-                'success': False,
-                'message': 'Item não encontrado no carrinho'
-            }), 404
+        # UPDATE condicionado ao estoque; só em caso de falha o item é consultado
+        # para diferenciar item inexistente de estoque insuficiente
+        cart_item = CartItem.set_quantity(current_user.id, product_id, quantity)
         
-        # Verificar estoque
-        if not cart_item.product.is_available(quantity):
+        if cart_item is None:
+            cart_item_id = db.session.scalar(
+                _select_cart_item_id,
+                {'user_id': current_user.id, 'product_id': product_id}
+            )
+            
+            if cart_item_id is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'Item não encontrado no carrinho'
+                }), 404
+            
             return jsonify({
                 'success': False,
                 'message': 'Quantidade excede o estoque disponível'
             }), 400
         
-        cart_item.quantity = quantity
+        # Serializar antes do commit, que expiraria o item
+        cart_item_data = cart_item.to_dict()
         db.session.commit()
         
         return jsonify({
             'success': True,
             'message': 'Item do carrinho atualizado com sucesso',
-            'data': cart_item.to_dict()
+            'data': cart_item_data
         }), 200
         
     except Exception as e:
@@ -249,10 +304,20 @@ def clear_cart():
         JSON: Resposta confirmando limpeza do carrinho
     """
     try:
-        models = get_models()
-        CartItem = models['CartItem']
+        # Com a fila habilitada, a limpeza é feita pelo worker
+        queue = tasks.get_queue()
+        if queue is not None:
+            job = queue.enqueue(tasks.clear_cart, current_user.id)
+            return jsonify({
+                'success': True,
+                'message': 'Limpeza do carrinho enfileirada',
+                'data': {'status': 'queued', 'job_id': job.id}
+            }), 202
         
-        CartItem.query.filter_by(user_id=current_user.id).delete()
+        db.session.execute(
+            db.delete(CartItem).where(CartItem.user_id == current_user.id),
+            execution_options={'synchronize_session': False}
+        )
         db.session.commit()
         
         return jsonify({
@@ -277,25 +342,18 @@ def get_cart_total():
         JSON: Total do carrinho e contagem de itens
     """
     try:
-        models = get_models()
-        CartItem = models['CartItem']
-        
-        cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-        
-        total = 0
-        item_count = 0
-        
-        for item in cart_items:
-            if item.product:
-                total += item.get_total_price()
-                item_count += item.quantity
+        # Agregação feita no banco, em centavos inteiros: uma linha com total,
+        # quantidade e itens distintos
+        total_cents, item_count, unique_items = db.session.execute(
+            _select_cart_totals, {'user_id': current_user.id}
+        ).one()
         
         return jsonify({
             'success': True,
             'data': {
-                'total': round(total, 2),
+                'total': total_cents / 100,
                 'item_count': item_count,
-                'unique_items': len(cart_items)
+                'unique_items': unique_items
             }
         }), 200
         
@@ -1,11 +1,47 @@
 """
 Rotas principais da aplicação
 """
-from flask import Blueprint, jsonify
+import orjson
+from flask import Blueprint, Response
 
 # Criar Blueprint para rotas principais
 main_bp = Blueprint('main', __name__)
 
+# Corpos constantes serializados uma única vez, na importação do módulo
+_WELCOME_JSON = orjson.dumps({
+    "message": "Welcome to E-commerce API",
+    "version": "1.0.0",
+    "endpoints": {
+        "auth": {
+            "login": "POST /login",
+            "logout": "POST /logout", 
+            "register": "POST /api/user/register"
+        },
+        "products": {
+            "list": "GET /api/products",
+            "get": "GET /api/products/{id}",
+            "search": "GET /api/products/search?q={term}",
+            "add": "POST /api/products/add",
+            "update": "PUT /api/products/update/{id}",
+            "delete": "DELETE /api/products/delete/{id}"
+        },
+        "cart": {
+            "view": "GET /api/cart",
+            "add": "POST /api/cart/add/{product_id}",
+            "remove": "DELETE /api/cart/remove/{product_id}",
+            "update": "PUT /api/cart/update/{product_id}",
+            "clear": "POST /api/cart/clear",
+            "checkout": "POST /api/cart/checkout",
+            "total": "GET /api/cart/total"
+        }
+    }
+})
+
+_HEALTH_JSON = orjson.dumps({
+    "status": "healthy",
+    "message": "E-commerce API is running"
+})
+
 
 @main_bp.route('/')
 def hello_world():
@@ -15,34 +51,7 @@ def hello_world():
     Returns:
         JSON: Mensagem de boas-vindas e informações da API
     """
-    return jsonify({
-        "message": "Welcome to E-commerce API",
-        "version": "1.0.0",
-        "endpoints": {
-            "auth": {
-                "login": "POST /login",
-                "logout": "POST /logout", 
-                "register": "POST /api/user/register"
-            },
-            "products": {
-                "list": "GET /api/products",
-                "get": "GET /api/products/{id}",
-                "search": "GET /api/products/search?q={term}",
-                "add": "POST /api/products/add",
-                "update": "PUT /api/products/update/{id}",
-                "delete": "DELETE /api/products/delete/{id}"
-            },
-            "cart": {
-                "view": "GET /api/cart",
-                "add": "POST /api/cart/add/{product_id}",
-                "remove": "DELETE /api/cart/remove/{product_id}",
-                "update": "PUT /api/cart/update/{product_id}",
-                "clear": "POST /api/cart/clear",
-                "checkout": "POST /api/cart/checkout",
-                "total": "GET /api/cart/total"
-            }
-        }
-    }), 200
+    return Response(_WELCOME_JSON, status=200, mimetype='application/json')
 
 
 @main_bp.route('/health')
@@ -53,7 +62,4 @@ def health_check():
     Returns:
         JSON: Status da aplicação
     """
-    return jsonify({
-        "status": "healthy",
-        "message": "E-commerce API is running"
-    }), 200
+    return Response(_HEALTH_JSON, status=200, mimetype='application/json')
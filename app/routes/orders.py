@@ -4,16 +4,143 @@ Rotas para gerenciamento de pedidos da API
 Este módulo contém todas as rotas relacionadas ao gerenciamento de pedidos,
 incluindo criação, listagem, atualização de status e detalhes dos pedidos.
 """
+import base64
+import json
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
+from sqlalchemy import bindparam, tuple_
+from sqlalchemy.orm import lazyload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from decimal import Decimal
 from datetime import datetime
 
-from app import db, get_models
+from app import db
+from app.models import CartItem, Order, OrderItem, Product, loader_options
+from app.routes.products import invalidate_products_cache
 
 # Criar blueprint para rotas de pedidos
 orders_bp = Blueprint('orders', __name__)
 
+# Baixa e devolução de estoque executadas em lote (executemany) no checkout
+# e no cancelamento
+_products_table = Product.__table__
+_decrement_stock = db.update(_products_table).where(
+    _products_table.c.id == bindparam('product_id')
+).values(stock=_products_table.c.stock - bindparam('quantity'))
+_restore_stock = db.update(_products_table).where(
+    _products_table.c.id == bindparam('product_id')
+).values(stock=_products_table.c.stock + bindparam('quantity'))
+
+
+# Pedido do usuário com itens e produtos: instrução montada uma única vez, com
+# parâmetros vinculados, para reaproveitar o SQL compilado em cache
+_select_user_order = db.select(Order).where(
+    Order.id == bindparam('order_id'),
+    Order.user_id == bindparam('user_id')
+)
+
+
+def _get_user_order(order_id, for_update=False):
+    """
+    Busca um pedido do usuário logado com seus itens e produtos
+    
+    Args:
+        order_id (int): ID do pedido
+        for_update (bool): Bloquear a linha do pedido até o fim da transação
+        
+    Returns:
+        Order: Pedido encontrado ou None
+    """
+    query = _select_user_order.options(
+        *loader_options(selectinload(Order.items).selectinload(OrderItem.product))
+    )
+    if for_update:
+        query = query.with_for_update(of=Order)
+    
+    return db.session.scalars(
+        query, {'order_id': order_id, 'user_id': current_user.id}
+    ).first()
+
+
+def _encode_cursor(order):
+    """
+    Gera o cursor opaco que aponta para depois de um pedido na listagem
+    
+    Args:
+        order (dict): Último pedido da página, já serializado
+        
+    Returns:
+        str: Cursor em base64 (URL-safe) com (created_at, id)
+    """
+    payload = json.dumps([order['created_at'].isoformat(), order['id']])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    """
+    Lê um cursor gerado por _encode_cursor
+    
+    Args:
+        cursor (str): Cursor recebido do cliente
+        
+    Returns:
+        tuple: (created_at, id) do último pedido da página anterior
+        
+    Raises:
+        ValueError: Se o cursor for inválido
+    """
+    try:
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Cursor inválido') from e
+
+
+def _serialize_order_rows(order_rows, username):
+    """
+    Monta os pedidos da listagem no mesmo formato de Order.to_dict
+    
+    Os itens de todos os pedidos da página são lidos em uma única projeção
+    Core (com o nome do produto já juntado), sem hidratar objetos ORM.
+    
+    Args:
+        order_rows (list): Linhas (RowMapping) da consulta de pedidos
+        username (str): Nome do usuário dono dos pedidos
+        
+    Returns:
+        list: Pedidos serializados
+    """
+    orders = {}
+    for row in order_rows:
+        order = dict(row)
+        order['username'] = username
+        order['items_count'] = 0
+        order['items'] = []
+        orders[row['id']] = order
+    
+    if orders:
+        item_rows = db.session.execute(
+            db.select(
+                OrderItem.id,
+                OrderItem.order_id,
+                OrderItem.product_id,
+                Product.name.label('product_name'),
+                OrderItem.quantity,
+                OrderItem.price
+            ).outerjoin(Product, Product.id == OrderItem.product_id).where(
+                OrderItem.order_id.in_(list(orders))
+            ).order_by(OrderItem.id)
+        ).mappings()
+        
+        for row in item_rows:
+            item = dict(row)
+            item['total_price'] = float(row['price']) * row['quantity']
+            order = orders[row['order_id']]
+            order['items'].append(item)
+            order['items_count'] += row['quantity']
+    
+    return list(orders.values())
+
 
 @orders_bp.route('/', methods=['GET'])
 @login_required
@@ -21,50 +148,63 @@ def get_orders():
     """
     Lista todos os pedidos do usuário logado
     
+    A paginação é por cursor sobre (created_at, id): cada página é uma busca
+    no índice, sem OFFSET nem COUNT, independentemente da profundidade.
+    
     Query Parameters:
         - status (str): Filtrar por status (opcional)
-        - page (int): Número da página (padrão: 1)
+        - cursor (str): Valor de next_cursor da página anterior (opcional)
         - per_page (int): Itens por página (padrão: 10)
     
     Returns:
         JSON: Lista de pedidos do usuário
     """
     try:
-        models = get_models()
-        Order = models['Order']
-        
         # Parâmetros de consulta
         status = request.args.get('status')
-        page = request.args.get('page', 1, type=int)
+        cursor = request.args.get('cursor')
         per_page = min(request.args.get('per_page', 10, type=int), 100)  # Máximo 100 por página
-        
-        # Construir consulta
-        query = Order.query.filter_by(user_id=current_user.id)
+        per_page = max(per_page, 1)
+        
+        # Construir consulta (projeção Core: a listagem é somente leitura)
+        query = db.select(
+            Order.id,
+            Order.user_id,
+            Order.total,
+            Order.status,
+            Order.created_at,
+            Order.updated_at
+        ).where(Order.user_id == current_user.id)
         
         if status:
-            query = query.filter_by(status=status)
+            query = query.where(Order.status == status)
         
-        # Ordenar por data de criação (mais recente primeiro)
-        query = query.order_by(Order.created_at.desc())
+        if cursor:
+            try:
+                created_at, order_id = _decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
+            query = query.where(tuple_(Order.created_at, Order.id) < (created_at, order_id))
         
-        # Paginação
-        orders = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+        # Ordenar por data de criação (mais recente primeiro); um item a mais
+        # indica se existe próxima página
+        query = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(per_page + 1)
+        rows = db.session.execute(query).mappings().all()
+        
+        has_next = len(rows) > per_page
+        orders = _serialize_order_rows(rows[:per_page], current_user.username)
         
         return jsonify({
             'success': True,
             'data': {
-                'orders': [order.to_dict() for order in orders.items],
+                'orders': orders,
                 'pagination': {
-                    'page': page,
                     'per_page': per_page,
-                    'total': orders.total,
-                    'pages': orders.pages,
-                    'has_next': orders.has_next,
-                    'has_prev': orders.has_prev
+                    'has_next': has_next,
+                    'next_cursor': _encode_cursor(orders[-1]) if has_next else None
                 }
             }
         })
@@ -90,13 +230,7 @@ def get_order(order_id):
         JSON: Detalhes do pedido
     """
     try:
-        models = get_models()
-        Order = models['Order']
-        
-        order = Order.query.filter_by(
-            id=order_id, 
-            user_id=current_user.id
-        ).first()
+        order = _get_user_order(order_id)
         
         if not order:
             return jsonify({
@@ -127,14 +261,27 @@ def create_order():
         JSON: Dados do pedido criado
     """
     try:
-        models = get_models()
-        Order = models['Order']
-        OrderItem = models['OrderItem']
-        CartItem = models['CartItem']
-        Product = models['Product']
+        # Buscar e bloquear os itens do carrinho do usuário. Linhas já
+        # bloqueadas por outra transação (checkout ou alteração do carrinho em
+        # andamento) são ignoradas em vez de aguardadas
+        cart_items = db.session.execute(
+            db.select(CartItem.id, CartItem.product_id, CartItem.quantity).where(
+                CartItem.user_id == current_user.id
+            ).with_for_update(skip_locked=True)
+        ).all()
+        
+        # Qualquer item ignorado deixaria o pedido com apenas parte do
+        # carrinho: o checkout só prossegue com todos os itens bloqueados
+        cart_count = db.session.scalar(
+            db.select(db.func.count(CartItem.id)).where(CartItem.user_id == current_user.id)
+        )
         
-        # Buscar itens do carrinho do usuário
-        cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
+        if len(cart_items) != cart_count:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': 'Pedido já está sendo processado'
+            }), 409
         
         if not cart_items:
             return jsonify({
@@ -142,53 +289,97 @@ def create_order():
                 'message': 'Carrinho vazio'
             }), 400
         
+        # Buscar e bloquear todos os produtos do carrinho em uma única consulta
+        # (em ordem de ID, para que checkouts concorrentes não se bloqueiem
+        # mutuamente) até o fim da transação
+        products = {
+            product.id: product
+            for product in db.session.scalars(
+                db.select(Product).where(
+                    Product.id.in_([item.product_id for item in cart_items])
+                ).order_by(Product.id).with_for_update(),
+                execution_options={'populate_existing': True}
+            )
+        }
+        
         # Verificar estoque dos produtos
         for cart_item in cart_items:
-            if not cart_item.product.is_in_stock(cart_item.quantity):
+            product = products[cart_item.product_id]
+            if not product.is_available(cart_item.quantity):
+                db.session.rollback()
                 return jsonify({
                     'success': False,
-                    'message': f'Produto "{cart_item.product.name}" não possui estoque suficiente'
+                    'message': f'Produto "{product.name}" não possui estoque suficiente'
                 }), 400
         
-        # Criar novo pedido
+        # Calcular o total em centavos inteiros (exato e sem aritmética Decimal
+        # por item); a conversão para Decimal acontece uma única vez
+        total_cents = sum(
+            products[cart_item.product_id].price_cents * cart_item.quantity
+            for cart_item in cart_items
+        )
+        
+        # Criar novo pedido (INSERT imediato: o ID é necessário para os itens)
         order = Order(
             user_id=current_user.id,
-            total=Decimal('0.00'),
+            total=Decimal(total_cents).scaleb(-2),
             status='pending'
         )
         db.session.add(order)
-        db.session.flush()  # Para obter o ID do pedido
-        
-        total = Decimal('0.00')
-        
-        # Criar itens do pedido
-        for cart_item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
-            )
-            db.session.add(order_item)
-            
-            # Reduzir estoque
-            cart_item.product.reduce_stock(cart_item.quantity)
-            
-            # Calcular total
-            total += cart_item.product.price * cart_item.quantity
-        
-        # Atualizar total do pedido
-        order.total = total
-        
-        # Limpar carrinho
-        CartItem.query.filter_by(user_id=current_user.id).delete()
+        db.session.flush()
+        
+        # Gravar todos os itens em um único INSERT em lote; com RETURNING os
+        # itens voltam como objetos já persistidos, sem passar pelo flush
+        item_rows = [
+            {
+                'order_id': order.id,
+                'product_id': cart_item.product_id,
+                'quantity': cart_item.quantity,
+                'price': products[cart_item.product_id].price
+            }
+            for cart_item in cart_items
+        ]
+        
+        if db.session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+            order_items = db.session.scalars(
+                db.insert(OrderItem).returning(OrderItem, sort_by_parameter_order=True).options(
+                    # Produtos já estão na sessão: lazyload os resolve pelo mapa
+                    # de identidade, sem o SELECT do selectin
+                    lazyload(OrderItem.product)
+                ),
+                item_rows
+            ).all()
+            set_committed_value(order, 'items', order_items)
+        else:
+            # Sem RETURNING em lote: os itens são gravados pelo flush do ORM
+            # (a coleção do pedido recém-criado parte vazia, sem SELECT)
+            set_committed_value(order, 'items', [])
+            order.items.extend(OrderItem(**row) for row in item_rows)
+            db.session.flush()
+        
+        # Reduzir estoque de todos os produtos em um único executemany
+        db.session.execute(_decrement_stock, [
+            {'product_id': item.product_id, 'quantity': item.quantity}
+            for item in cart_items
+        ])
+        
+        # Limpar do carrinho apenas os itens bloqueados e incluídos no pedido
+        # (DELETE único); itens bloqueados por outra transação permanecem
+        db.session.execute(
+            db.delete(CartItem).where(CartItem.id.in_([item.id for item in cart_items])),
+            execution_options={'synchronize_session': False}
+        )
         
+        # Serializar antes do commit: itens e produtos já estão na sessão, e o
+        # commit os expiraria
+        order_data = order.to_dict()
         db.session.commit()
+        invalidate_products_cache(*products)
         
         return jsonify({
             'success': True,
             'message': 'Pedido criado com sucesso',
-            'data': order.to_dict()
+            'data': order_data
         }), 201
         
     except Exception as e:
@@ -213,14 +404,9 @@ def cancel_order(order_id):
         JSON: Confirmação do cancelamento
     """
     try:
-        models = get_models()
-        Order = models['Order']
-        Product = models['Product']
-        
-        order = Order.query.filter_by(
-            id=order_id, 
-            user_id=current_user.id
-        ).first()
+        # Pedido bloqueado até o commit: dois cancelamentos simultâneos não
+        # podem devolver o estoque duas vezes
+        order = _get_user_order(order_id, for_update=True)
         
         if not order:
             return jsonify({
@@ -234,22 +420,27 @@ def cancel_order(order_id):
                 'message': 'Apenas pedidos pendentes podem ser cancelados'
             }), 400
         
-        # Restaurar estoque dos produtos
-        for item in order.items:
-            product = Product.query.get(item.product_id)
-            if product:
-                product.stock += item.quantity
+        # Restaurar o estoque de todos os itens em uma única instrução
+        # (executemany), incrementando no banco em vez de ler e regravar
+        product_ids = [item.product_id for item in order.items]
+        db.session.execute(_restore_stock, [
+            {'product_id': item.product_id, 'quantity': item.quantity}
+            for item in order.items
+        ])
         
         # Atualizar status do pedido
         order.status = 'cancelled'
         order.updated_at = datetime.utcnow()
         
+        # Serializar antes do commit, que expiraria o pedido e seus itens
+        order_data = order.to_dict()
         db.session.commit()
+        invalidate_products_cache(*product_ids)
         
         return jsonify({
             'success': True,
             'message': 'Pedido cancelado com sucesso',
-            'data': order.to_dict()
+            'data': order_data
         })
         
     except Exception as e:
@@ -294,12 +485,9 @@ def update_order_status(order_id):
                 'message': f'Status inválido. Valores válidos: {", ".join(valid_statuses)}'
             }), 400
         
-        models = get_models()
-        Order = models['Order']
-        
         # Por enquanto, qualquer usuário pode atualizar o status
         # Em uma implementação real, verificaria se é admin
-        order = Order.query.get(order_id)
+        order = db.session.get(Order, order_id)
         
         if not order:
             return jsonify({
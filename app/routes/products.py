@@ -4,15 +4,195 @@ Rotas de gerenciamento de produtos
 Este módulo contém todas as rotas relacionadas aos produtos,
 incluindo listagem, criação, atualização, exclusão e busca.
 """
-from flask import Blueprint, request, jsonify
+import hashlib
+import uuid
+from functools import wraps
+
+from flask import Blueprint, request, jsonify, make_response
 from flask_login import login_required
-from app import db, get_models
+from sqlalchemy.orm import selectinload
+from app import db, cache
+from app.models import Category, Product
 
 # Criar blueprint para rotas de produtos
 products_bp = Blueprint('products', __name__)
 
 
+def _products_version():
+    """Retorna a versão atual do catálogo, trocada a cada alteração em produtos"""
+    return cache.get('products_version') or '0'
+
+
+def _products_cache_key():
+    """
+    Gera a chave de cache da listagem de produtos
+    
+    A chave inclui a versão atual do catálogo e os filtros da consulta, de modo
+    que qualquer alteração em produtos invalida todas as listagens de uma vez.
+    
+    Returns:
+        str: Chave de cache
+    """
+    version = _products_version()
+    category_id = request.args.get('category_id', type=int)
+    active_only = request.args.get('active_only', 'true').lower() == 'true'
+    per_page, cursor = _page_args()
+    return f'products_all:{version}:{category_id}:{active_only}:{per_page}:{cursor}'
+
+
+def _categories_cache_key():
+    """Gera a chave de cache da listagem de categorias (inclui products_count)"""
+    return f'categories:{_products_version()}'
+
+
+def _product_cache_key(product_id):
+    """Gera a chave de cache dos detalhes de um produto"""
+    return f'product_{product_id}'
+
+
+def _is_success(response):
+    """Indica se a resposta da view deve ser armazenada em cache (apenas 200)"""
+    if isinstance(response, tuple):
+        return response[1] == 200
+    return response.status_code == 200
+
+
+def _with_etag(view):
+    """
+    Acrescenta ETag (hash do corpo) e Cache-Control às respostas 200 da view
+    
+    Aplicado abaixo de cache.cached, o hash é calculado apenas quando a
+    resposta é gerada e fica armazenado junto com ela no cache; a resposta
+    304 para If-None-Match é decidida em _make_conditional.
+    
+    Args:
+        view (function): View de listagem
+        
+    Returns:
+        function: View decorada
+    """
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(hashlib.blake2b(response.get_data(), digest_size=16).hexdigest())
+            response.cache_control.public = True
+            response.cache_control.max_age = 60
+        return response
+    return decorated
+
+
+@products_bp.after_request
+def _make_conditional(response):
+    """Responde 304 Not Modified quando o If-None-Match coincide com o ETag"""
+    if request.method == 'GET' and response.get_etag()[0]:
+        return response.make_conditional(request)
+    return response
+
+
+def invalidate_products_cache(*product_ids):
+    """
+    Invalida o cache do catálogo após alterações em produtos
+    
+    Args:
+        *product_ids (int): IDs dos produtos alterados, cujos detalhes também
+            são removidos do cache
+    """
+    cache.set('products_version', uuid.uuid4().hex, timeout=0)
+    if product_ids:
+        cache.delete_many(*[_product_cache_key(product_id) for product_id in product_ids])
+
+
+def _select_products():
+    """
+    Monta a consulta Core com as colunas serializadas nas listagens de produtos
+    
+    Returns:
+        Select: Consulta com o nome da categoria já juntado
+    """
+    return db.select(
+        Product.id,
+        Product.name,
+        Product.description,
+        Product.price,
+        Product.stock,
+        Product.category_id,
+        Category.name.label('category_name'),
+        Product.is_active,
+        Product.created_at,
+        Product.updated_at
+    ).outerjoin(Category, Category.id == Product.category_id)
+
+
+def _page_args():
+    """
+    Lê os parâmetros de paginação das listagens de produtos
+    
+    Returns:
+        tuple: (per_page, cursor), com per_page entre 1 e 100 e cursor sendo o
+            último ID da página anterior (0 na primeira página)
+    """
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), 100))
+    cursor = request.args.get('cursor', 0, type=int)
+    return per_page, cursor
+
+
+def _fetch_products_page(query):
+    """
+    Executa uma consulta de produtos paginada por chave (id)
+    
+    Busca um item além do tamanho da página para saber se há próxima página,
+    sem COUNT nem OFFSET.
+    
+    Args:
+        query (Select): Consulta montada por _select_products
+        
+    Returns:
+        tuple: (linhas da página, dados de paginação)
+    """
+    per_page, cursor = _page_args()
+    rows = db.session.execute(
+        query.where(Product.id > cursor).order_by(Product.id).limit(per_page + 1)
+    ).mappings().all()
+    
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    return rows, {
+        'per_page': per_page,
+        'has_next': has_next,
+        'next_cursor': rows[-1]['id'] if has_next else None
+    }
+
+
+def _update_product(product_id, values):
+    """
+    Atualiza um produto com um único UPDATE
+    
+    Em dialetos com suporte a UPDATE ... RETURNING o produto atualizado vem na
+    própria instrução; nos demais, é carregado após o UPDATE.
+    
+    Args:
+        product_id (int): ID do produto
+        values (dict): Colunas a serem atualizadas
+        
+    Returns:
+        Product: Produto atualizado, ou None se não existir
+    """
+    stmt = db.update(Product).where(Product.id == product_id).values(**values)
+    
+    if db.session.get_bind().dialect.update_returning:
+        return db.session.scalars(
+            stmt.returning(Product), execution_options={'populate_existing': True}
+        ).first()
+    
+    if db.session.execute(stmt).rowcount == 0:
+        return None
+    return db.session.get(Product, product_id, populate_existing=True)
+
+
 @products_bp.route('/', methods=['GET'])
+@cache.cached(make_cache_key=_products_cache_key, response_filter=_is_success)
+@_with_etag
 def get_all_products():
     """
     Lista todos os produtos disponíveis
@@ -20,32 +200,32 @@ def get_all_products():
     Query Parameters:
         - category_id (int): Filtrar por categoria (opcional)
         - active_only (bool): Apenas produtos ativos (padrão: true)
+        - cursor (int): Valor de next_cursor da página anterior (opcional)
+        - per_page (int): Itens por página (padrão: 20, máximo: 100)
     
     Returns:
-        JSON: Lista de produtos
+        JSON: Página de produtos
     """
     try:
-        models = get_models()
-        Product = models['Product']
-        
         # Parâmetros de consulta
         category_id = request.args.get('category_id', type=int)
         active_only = request.args.get('active_only', 'true').lower() == 'true'
         
-        # Construir consulta
-        query = Product.query
+        # Construir consulta (projeção Core: evita hidratar objetos ORM na listagem)
+        query = _select_products()
         
         if active_only:
-            query = query.filter_by(is_active=True)
+            query = query.where(Product.is_active == True)
         
         if category_id:
-            query = query.filter_by(category_id=category_id)
+            query = query.where(Product.category_id == category_id)
         
-        products = query.all()
+        rows, pagination = _fetch_products_page(query)
         
         return jsonify({
             'success': True,
-            'data': [product.to_dict() for product in products]
+            'data': [dict(row) for row in rows],
+            'pagination': pagination
         }), 200
         
     except Exception as e:
@@ -60,6 +240,9 @@ def get_product_details(product_id):
     """
     Obtém detalhes de um produto específico
     
+    Responde com ETag derivado de (id, updated_at) e retorna 304 quando o
+    cliente envia If-None-Match com a versão atual do produto.
+    
     Args:
         product_id (int): ID do produto
     
@@ -67,21 +250,33 @@ def get_product_details(product_id):
         JSON: Detalhes do produto
     """
     try:
-        models = get_models()
-        Product = models['Product']
-        
-        product = Product.query.get(product_id)
+        cache_key = _product_cache_key(product_id)
+        data = cache.get(cache_key)
         
-        if not product:
-            return jsonify({
-                'success': False,
-                'message': 'Produto não encontrado'
-            }), 404
-        
-        return jsonify({
+        if data is None:
+            product = db.session.get(Product, product_id)
+            
+            if not product:
+                return jsonify({
+                    'success': False,
+                    'message': 'Produto não encontrado'
+                }), 404
+            
+            data = product.to_dict()
+            
+            # Produtos inativos ou sem estoque mudam com frequência (reposição,
+            # reativação); apenas os demais são mantidos em cache
+            if product.is_active and product.stock > 0:
+                cache.set(cache_key, data, timeout=300)
+        
+        response = jsonify({
             'success': True,
-            'data': product.to_dict()
-        }), 200
+            'data': data
+        })
+        response.set_etag(hashlib.blake2b(f"{data['id']}:{data['updated_at']}".encode(), digest_size=16).hexdigest())
+        response.cache_control.public = True
+        response.cache_control.max_age = 60
+        return response
         
     except Exception as e:
         return jsonify({
@@ -136,9 +331,6 @@ def create_product():
                 'message': 'Preço deve ser um número válido'
             }), 400
         
-        models = get_models()
-        Product = models['Product']
-        
         product = Product(
             name=name,
             description=data.get('description', ''),
@@ -149,6 +341,7 @@ def create_product():
         
         db.session.add(product)
         db.session.commit()
+        invalidate_products_cache()
         
         return jsonify({
             'success': True,
@@ -164,6 +357,48 @@ def create_product():
         }), 500
 
 
+def _clean_name(value):
+    """Valida o nome do produto, removendo espaços nas extremidades"""
+    name = value.strip() if isinstance(value, str) else ''
+    if not name:
+        raise ValueError('Nome do produto não pode estar vazio')
+    return name
+
+
+def _clean_price(value):
+    """Valida o preço do produto (número não negativo)"""
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('Preço deve ser um número válido') from None
+    if price < 0:
+        raise ValueError('Preço deve ser um valor positivo')
+    return price
+
+
+def _clean_stock(value):
+    """Valida o estoque do produto (inteiro não negativo)"""
+    try:
+        stock = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Estoque deve ser um número inteiro válido') from None
+    if stock < 0:
+        raise ValueError('Estoque deve ser um valor não negativo')
+    return stock
+
+
+# Campos aceitos na atualização de produto e a função que valida/normaliza
+# cada um (ValueError com a mensagem de erro em caso de valor inválido)
+_PRODUCT_UPDATE_FIELDS = {
+    'name': _clean_name,
+    'description': lambda value: value,
+    'price': _clean_price,
+    'stock': _clean_stock,
+    'category_id': lambda value: value,
+    'is_active': bool
+}
+
+
 @products_bp.route('/<int:product_id>', methods=['PUT'])
 @login_required
 def update_product(product_id):
@@ -193,72 +428,43 @@ def update_product(product_id):
                 'message': 'Dados não fornecidos'
             }), 400
         
-        models = get_models()
-        Product = models['Product']
+        # Validar e coletar os campos fornecidos em uma única passagem
+        try:
+            values = {
+                field: clean(data[field])
+                for field, clean in _PRODUCT_UPDATE_FIELDS.items()
+                if field in data
+            }
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
         
-        product = Product.query.get(product_id)
+        if values:
+            # UPDATE único (sem SELECT prévio); o RETURNING devolve o produto
+            # atualizado e uma linha ausente indica que o produto não existe
+            product = _update_product(product_id, values)
+        else:
+            product = db.session.get(Product, product_id)
         
         if not product:
+            db.session.rollback()
             return jsonify({
                 'success': False,
                 'message': 'Produto não encontrado'
             }), 404
         
-        # Atualizar campos fornecidos
-        if 'name' in data:
-            name = data['name'].strip()
-            if not name:
-                return jsonify({
-                    'success': False,
-                    'message': 'Nome do produto não pode estar vazio'
-                }), 400
-            product.name = name
-        
-        if 'description' in data:
-            product.description = data['description']
-        
-        if 'price' in data:
-            try:
-                price = float(data['price'])
-                if price < 0:
-                    return jsonify({
-                        'success': False,
-                        'message': 'Preço deve ser um valor positivo'
-                    }), 400
-                product.price = price
-            except (TypeError, ValueError):
-                return jsonify({
-                    'success': False,
-                    'message': 'Preço deve ser um número válido'
-                }), 400
-        
-        if 'stock' in data:
-            try:
-                stock = int(data['stock'])
-                if stock < 0:
-                    return jsonify({
-                        'success': False,
-                        'message': 'Estoque deve ser um valor não negativo'
-                    }), 400
-                product.stock = stock
-            except (TypeError, ValueError):
-                return jsonify({
-                    'success': False,
-                    'message': 'Estoque deve ser um número inteiro válido'
-                }), 400
-        
-        if 'category_id' in data:
-            product.category_id = data['category_id']
-        
-        if 'is_active' in data:
-            product.is_active = bool(data['is_active'])
-        
+        # Serializar antes do commit: os valores vieram do RETURNING e o
+        # commit expiraria o objeto, forçando um novo SELECT
+        product_data = product.to_dict()
         db.session.commit()
+        invalidate_products_cache(product_id)
         
         return jsonify({
             'success': True,
             'message': 'Produto atualizado com sucesso',
-            'data': product.to_dict()
+            'data': product_data
         }), 200
         
     except Exception as e:
@@ -282,20 +488,20 @@ def delete_product(product_id):
         JSON: Confirmação da exclusão
     """
     try:
-        models = get_models()
-        Product = models['Product']
-        
-        product = Product.query.get(product_id)
+        # Soft delete - apenas marcar como inativo, em um único UPDATE
+        result = db.session.execute(
+            db.update(Product).where(Product.id == product_id).values(is_active=False)
+        )
         
-        if not product:
+        if result.rowcount == 0:
+            db.session.rollback()
             return jsonify({
                 'success': False,
                 'message': 'Produto não encontrado'
             }), 404
         
-        # Soft delete - apenas marcar como inativo
-        product.is_active = False
         db.session.commit()
+        invalidate_products_cache(product_id)
         
         return jsonify({
             'success': True,
@@ -318,9 +524,11 @@ def search_products():
     Query Parameters:
         - q (str): Termo de busca
         - category_id (int): Filtrar por categoria (opcional)
+        - cursor (int): Valor de next_cursor da página anterior (opcional)
+        - per_page (int): Itens por página (padrão: 20, máximo: 100)
     
     Returns:
-        JSON: Lista de produtos encontrados
+        JSON: Página de produtos encontrados
     """
     try:
         search_term = request.args.get('q', '').strip()
@@ -332,25 +540,24 @@ def search_products():
                 'message': 'Termo de busca é obrigatório'
             }), 400
         
-        models = get_models()
-        Product = models['Product']
-        
-        # Construir consulta de busca
-        query = Product.query.filter(
+        # Construir consulta de busca (no PostgreSQL, o ILIKE por substring usa
+        # o índice GIN de trigramas ix_products_name_trgm)
+        query = _select_products().where(
             Product.name.ilike(f'%{search_term}%'),
             Product.is_active == True
         )
         
         if category_id:
-            query = query.filter_by(category_id=category_id)
+            query = query.where(Product.category_id == category_id)
         
-        products = query.all()
+        rows, pagination = _fetch_products_page(query)
         
         return jsonify({
             'success': True,
-            'data': [product.to_dict() for product in products],
+            'data': [dict(row) for row in rows],
             'search_term': search_term,
-            'results_count': len(products)
+            'results_count': len(rows),
+            'pagination': pagination
         }), 200
         
     except Exception as e:
@@ -361,6 +568,8 @@ def search_products():
 
 
 @products_bp.route('/categories', methods=['GET'])
+@cache.cached(timeout=60, make_cache_key=_categories_cache_key, response_filter=_is_success)
+@_with_etag
 def get_categories():
     """
     Lista todas as categorias de produtos
@@ -369,10 +578,12 @@ def get_categories():
         JSON: Lista de categorias
     """
     try:
-        models = get_models()
-        Category = models['Category']
-        
-        categories = Category.query.all()
+        # Apenas os IDs dos produtos são necessários para products_count
+        categories = db.session.scalars(
+            db.select(Category).options(
+                selectinload(Category.products).load_only(Product.id)
+            )
+        ).all()
         
         return jsonify({
             'success': True,
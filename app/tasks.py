@@ -0,0 +1,82 @@
+"""
+Tarefas assíncronas da aplicação E-commerce
+
+Este módulo contém as escritas no carrinho que podem ser executadas fora da
+requisição por um worker RQ. Cada tarefa abre seu próprio contexto de
+aplicação e, portanto, sua própria sessão do banco de dados.
+
+Usage:
+    rq worker --url redis://localhost:6379/0 ecommerce
+"""
+import os
+
+from flask import current_app
+
+from app import db
+
+# Aplicação usada pelo worker (criada sob demanda, uma vez por processo)
+_worker_app = None
+
+
+def get_queue():
+    """
+    Retorna a fila de tarefas da aplicação atual
+    
+    Returns:
+        rq.Queue: Fila configurada, ou None se as tarefas forem síncronas
+    """
+    return current_app.extensions.get('task_queue')
+
+
+def _app_context():
+    """Abre um contexto de aplicação para a tarefa em execução"""
+    global _worker_app
+    if _worker_app is None:
+        from app import create_app
+        _worker_app = create_app(os.environ.get('FLASK_ENV') or 'production')
+    return _worker_app.app_context()
+
+
+def add_to_cart(user_id, product_id, quantity):
+    """
+    Adiciona um produto ao carrinho do usuário
+    
+    Args:
+        user_id (int): ID do usuário
+        product_id (int): ID do produto
+        quantity (int): Quantidade a ser adicionada
+        
+    Returns:
+        bool: True se o item foi gravado
+    """
+    with _app_context():
+        from app.models import CartItem, Product
+        
+        product = db.session.get(Product, product_id)
+        if not product or not product.is_available(quantity):
+            return False
+        
+        cart_item = CartItem.add_quantity(user_id, product_id, quantity, max_quantity=product.stock)
+        if cart_item is None:
+            db.session.rollback()
+            return False
+        
+        db.session.commit()
+        return True
+
+
+def clear_cart(user_id):
+    """
+    Remove todos os itens do carrinho do usuário
+    
+    Args:
+        user_id (int): ID do usuário
+    """
+    with _app_context():
+        from app.models import CartItem
+        
+        db.session.execute(
+            db.delete(CartItem).where(CartItem.user_id == user_id),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
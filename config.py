@@ -16,11 +16,52 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///ecommerce.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Pool de conexões: reutiliza conexões entre requisições em vez de abrir
+    # uma nova a cada acesso (pre_ping descarta conexões derrubadas pelo servidor).
+    # Cada processo do servidor tem o seu pool, então
+    # workers × (DB_POOL_SIZE + DB_MAX_OVERFLOW) deve caber em max_connections
+    # do banco; pool_timeout faz a requisição falhar rápido quando o pool esgota
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 20)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+        # Cache de SQL compilado por engine (padrão do SQLAlchemy: 500); cada
+        # variação de consulta ocupa uma entrada
+        'query_cache_size': int(os.environ.get('DB_QUERY_CACHE_SIZE', 1200))
+    }
+    
+    # Consultas mais lentas que este limite (em segundos) são registradas no
+    # log da aplicação; 0 desativa o registro
+    SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD', 0.05))
+    
     # Configurações de sessão
     PERMANENT_SESSION_LIFETIME = timedelta(hours=1)
     
+    # Duração mínima do login em segundos (tempo de resposta uniforme, sem
+    # revelar se o usuário existe)
+    LOGIN_MIN_DURATION = 0.3
+    
+    # Sessões no servidor (Flask-Session); sem SESSION_TYPE a sessão fica no cookie
+    SESSION_TYPE = os.environ.get('SESSION_TYPE')
+    SESSION_USE_SIGNER = True
+    
+    # Redis compartilhado por cache, sessões e fila de tarefas
+    REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+    
+    # Fila de tarefas (RQ): escritas do carrinho executadas por um worker
+    TASK_QUEUE_ENABLED = os.environ.get('TASK_QUEUE_ENABLED', 'false').lower() == 'true'
+    TASK_QUEUE_NAME = 'ecommerce'
+    
     # Configurações de CORS
     CORS_ORIGINS = ["http://localhost:3000", "http://127.0.0.1:3000"]
+    
+    # Configurações de cache (Flask-Caching)
+    CACHE_TYPE = os.environ.get('CACHE_TYPE') or 'SimpleCache'
+    CACHE_REDIS_URL = REDIS_URL
+    CACHE_DEFAULT_TIMEOUT = 300
+    CACHE_KEY_PREFIX = 'ecom_'
 
 
 class DevelopmentConfig(Config):
@@ -28,7 +69,10 @@ class DevelopmentConfig(Config):
     Configuração para desenvolvimento
     """
     DEBUG = True
-    SQLALCHEMY_ECHO = True  # Log de queries SQL
+    # Log de todas as queries SQL apenas sob demanda (SQL_ECHO=1): formatar e
+    # registrar cada instrução domina o tempo das requisições em medições
+    SQLALCHEMY_ECHO = os.environ.get('SQL_ECHO') == '1'
+    SQLALCHEMY_RAISELOAD = True  # Carregamentos não planejados (N+1) geram erro
 
 
 class ProductionConfig(Config):
@@ -41,6 +85,10 @@ class ProductionConfig(Config):
     SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     
+    # Cache e sessões compartilhados entre workers
+    CACHE_TYPE = os.environ.get('CACHE_TYPE') or 'RedisCache'
+    SESSION_TYPE = os.environ.get('SESSION_TYPE') or 'redis'
+    
     def __init__(self):
         if not self.SECRET_KEY:
             raise ValueError("SECRET_KEY environment variable must be set for production")
@@ -52,7 +100,15 @@ class TestingConfig(Config):
     """
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # SQLite em memória usa StaticPool
+    
+    # Detecção de N+1: relacionamentos não carregados explicitamente geram erro
+    # e cada resposta informa quantas consultas executou (X-Query-Count)
+    SQLALCHEMY_RAISELOAD = True
+    SQLALCHEMY_COUNT_QUERIES = True
     WTF_CSRF_ENABLED = False
+    CACHE_TYPE = 'NullCache'
+    LOGIN_MIN_DURATION = 0
 
 
 # Dicionário de configurações
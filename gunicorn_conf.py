@@ -0,0 +1,29 @@
+"""
+Configuração do gunicorn para produção
+
+Workers gevent atendem centenas de requisições simultâneas por processo
+enquanto esperam pelo banco e pelo Redis. Cada processo tem o seu pool de
+conexões, então workers × (DB_POOL_SIZE + DB_MAX_OVERFLOW) deve caber em
+max_connections do banco.
+
+Usage:
+    gunicorn -c gunicorn_conf.py wsgi:application
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = 'gevent'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+
+
+def post_fork(server, worker):
+    """
+    Torna o psycopg2 cooperativo com os greenlets em cada worker
+    
+    O driver é uma extensão em C que não é afetada pelo monkey patching do
+    gevent; sem este ajuste, cada consulta bloquearia o processo inteiro.
+    """
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
@@ -2,17 +2,25 @@
 Ponto de entrada principal da aplicação Flask E-commerce API
 
 Este arquivo inicializa e executa a aplicação Flask.
-Execute este arquivo para iniciar o servidor de desenvolvimento.
+Execute este arquivo para iniciar o servidor de desenvolvimento; em produção
+use o gunicorn (ver gunicorn_conf.py).
 
 Usage:
     python run.py
 """
+import os
+import sys
+
 from app import create_app
 
 # Criar instância da aplicação
-app = create_app()
+app = create_app(os.environ.get('FLASK_ENV') or 'development')
 
 if __name__ == '__main__':
+    # O servidor embutido atende uma requisição por vez: apenas desenvolvimento
+    if not app.debug:
+        sys.exit("Use o gunicorn fora do desenvolvimento: gunicorn -c gunicorn_conf.py wsgi:application")
+    
     print("🚀 Starting E-commerce API...")
     print("📖 API Documentation available at: http://127.0.0.1:5000/")
     print("🏥 Health check available at: http://127.0.0.1:5000/health")
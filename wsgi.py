@@ -0,0 +1,19 @@
+"""
+Ponto de entrada WSGI da aplicação Flask E-commerce API para produção
+
+O monkey patching do gevent precisa acontecer antes de qualquer outro import,
+para que os sockets usados pelo banco de dados e pelo Redis cooperem com os
+greenlets dos workers.
+
+Usage:
+    gunicorn -c gunicorn_conf.py wsgi:application
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import os
+
+from app import create_app
+
+# Criar instância da aplicação
+application = create_app(os.environ.get('FLASK_ENV') or 'production')